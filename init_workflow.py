@@ -32,6 +32,14 @@ jobs:
         uses: actions/setup-python@v5
         with:
           python-version: "3.11"
+          cache: pip
+
+      - name: Cache compiled templates
+        uses: actions/cache@v4
+        with:
+          path: .jinja_cache
+          key: jinja-${{ hashFiles('templates/**') }}
+          restore-keys: jinja-
 
       - name: Install deps
         run: |
@@ -43,7 +51,7 @@ jobs:
           BASE_URL: ${{ secrets.BASE_URL }}
           ADS_TXT_LINE: ${{ secrets.ADS_TXT_LINE }}
         run: |
-          python scripts/build_site.py
+          python -OO scripts/build_site.py
           test -f dist/index.html
 
       - name: Upload artifact
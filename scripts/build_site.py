@@ -11,12 +11,23 @@ AutoSpec site builder
   -> Targets only (new URLs) are listed in the sitemap
 """
 import os
+import argparse
 import csv
+import hashlib
 import json
 import pathlib
-from typing import List, Dict
-from xml.etree.ElementTree import Element, SubElement, tostring
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache, partial
+from operator import itemgetter
+from typing import List, Dict, NamedTuple, Tuple
+from xml.sax.saxutils import escape as xml_escape
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    select_autoescape,
+)
 import datetime as dt
 
 # ── Paths ────────────────────────────────────────────────────────────────────
@@ -25,20 +36,83 @@ DATA = ROOT / "data" / "items.csv"
 REDIRECTS = ROOT / "data" / "redirects.csv"  # optional: old_slug,new_slug
 CONF = ROOT / "config" / "affiliates.json"  # optional
 TPL = ROOT / "templates"
+TPL_CACHE = ROOT / ".jinja_cache"  # compiled template bytecode, reused across builds
 OUT = ROOT / "dist"
+MANIFEST = ROOT / ".build_manifest.json"  # slug -> input/output hashes of the last build
+
+
+# Soft-redirect page; {to_url} is filled in by write_soft_redirect().
+REDIRECT_TMPL = """<!doctype html>
+<html lang="ko"><head>
+<meta charset="utf-8"/>
+<meta http-equiv="refresh" content="0;url={to_url}"/>
+<link rel="canonical" href="{to_url}"/>
+<title>Redirecting…</title>
+</head><body>
+<p>이 페이지는 <a href="{to_url}">여기로 이동</a>했어.</p>
+</body></html>
+"""
+
+# Below this many rows to render, pages are rendered in-process instead of in a pool.
+PARALLEL_MIN_ROWS = 256
+
+# items.csv columns used by the builder; read_items() yields tuples in this order.
+ITEM_COLUMNS = ("deeplink_slug", "keyword", "entity", "attribute", "modifier", "merchant")
+Item = Tuple[str, str, str, str, str, str]
+AffiliateLink = Tuple[str, str | None, str]  # (pre, post, tail), see build_affiliate_links()
+
+
+class PageMeta(NamedTuple):
+    """Index/sitemap entry for a generated page; index.html reads all three fields."""
+
+    title: str
+    desc: str
+    path: str
 
 
 # ── Helpers ──────────────────────────────────────────────────────────────────
 def ensure_dir(p: pathlib.Path) -> None:
-    os.makedirs(p, exist_ok=True)
+    p.mkdir(parents=True, exist_ok=True)
 
 
-def read_json_safe(path: pathlib.Path) -> Dict:
+def read_items(path: pathlib.Path, strict: bool = False) -> List[Item]:
+    """
+    Reads items.csv into tuples ordered like ITEM_COLUMNS (values stripped).
+    Missing columns and short rows read as "" (an error when strict),
+    rows without a slug are dropped.
+    """
+    # utf-8-sig: spreadsheet exports often start with a BOM, which would otherwise
+    # end up in the first header name.
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        missing = [c for c in ITEM_COLUMNS if c not in header]
+        if strict and missing:
+            raise SystemExit(f"--strict: {path} is missing column(s): {', '.join(missing)}")
+        width = len(header)
+        # Missing columns point one past the header, at an always-empty sentinel cell.
+        get = itemgetter(*(header.index(c) if c in header else width for c in ITEM_COLUMNS))
+        items: List[Item] = []
+        for rec in reader:
+            if len(rec) != width:
+                # Pad short rows, drop extra cells (DictReader files them under None).
+                rec = (rec + [""] * width)[:width]
+            rec.append("")
+            item = tuple(v.strip() for v in get(rec))
+            if item[0]:
+                items.append(item)
+    return items
+
+
+def read_json_safe(path: pathlib.Path, strict: bool = False) -> Dict:
+    """Missing file -> {}. An unreadable/invalid file is {} too, or an error when strict."""
     if not path.exists():
         return {}
     try:
         return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
+    except Exception as e:
+        if strict:
+            raise SystemExit(f"--strict: cannot read {path}: {e}")
         return {}
 
 
@@ -47,12 +121,37 @@ def now_utc_iso() -> str:
     return dt.datetime.now(dt.UTC).replace(microsecond=0).isoformat().replace("+00:00", "Z")
 
 
+def fingerprint(*parts: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path: str) -> str | None:
+    """content_digest() of the file on disk, or None if it does not exist."""
+    try:
+        with open(path, "rb") as fh:
+            return content_digest(fh.read())
+    except FileNotFoundError:
+        return None
+
+
 def norm_base_url(url: str) -> str:
     return url[:-1] if url.endswith("/") else url
 
 
-def load_affiliate(merchant: str, slug: str) -> str:
+def build_affiliate_links(conf: Dict) -> Dict[str, AffiliateLink]:
     """
+    Splits each merchant's deeplink_base around {slug} once per build, so a row
+    only concatenates pre + slug + post + tail (tail = "?utm" or "&utm").
+    A base without {slug} links every item to the same URL: (url, None, "").
+
     config/affiliates.json example:
     {
       "amazon": {
@@ -61,17 +160,20 @@ def load_affiliate(merchant: str, slug: str) -> str:
       }
     }
     """
-    conf = read_json_safe(CONF)
-    m = conf.get(merchant or "", {})
-    base = (m.get("deeplink_base") or "").format(slug=slug)
-    utm = m.get("utm") or ""
-    if base and utm:
-        sep = "&" if "?" in base else "?"
-        return f"{base}{sep}{utm}"
-    return base
-
-
-def schema_org_article(title: str, desc: str, url: str) -> Dict:
+    links: Dict[str, AffiliateLink] = {}
+    for merchant, m in conf.items():
+        base = m.get("deeplink_base") or ""
+        if not base:
+            continue
+        pre, placeholder, post = base.partition("{slug}")
+        pre, post = pre.format(), post.format()  # unescape {{ }} like str.format did
+        utm = m.get("utm") or ""
+        tail = f"{'&' if '?' in pre + post else '?'}{utm}" if utm else ""
+        links[merchant] = (pre, post, tail) if placeholder else (pre + tail, None, "")
+    return links
+
+
+def schema_org_article(title: str, desc: str, url: str, date_modified: str) -> Dict:
     return {
         "@context": "https://schema.org",
         "@type": "Article",
@@ -79,7 +181,7 @@ def schema_org_article(title: str, desc: str, url: str) -> Dict:
         "description": desc,
         "mainEntityOfPage": {"@type": "WebPage", "@id": url},
         "author": {"@type": "Person", "name": "AutoSpec"},
-        "dateModified": dt.date.today().isoformat(),
+        "dateModified": date_modified,
     }
 
 
@@ -93,32 +195,33 @@ def write_robots_txt(dist: pathlib.Path, base_url: str) -> None:
     (dist / "robots.txt").write_text(robots_txt, encoding="utf-8")
 
 
-def write_sitemap(dist: pathlib.Path, base_url: str, pages_meta: List[Dict]) -> None:
+def write_sitemap(dist: pathlib.Path, base_url: str, pages_meta: List[PageMeta]) -> None:
     """
     Writes sitemap.xml with XML declaration, UTC datetime lastmod.
     Only target URLs (index + generated pages) are listed.
     """
-    urlset = Element("urlset", xmlns="http://www.sitemaps.org/schemas/sitemap/0.9")
+    parts = [
+        "<?xml version='1.0' encoding='UTF-8'?>\n"
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
 
     def add_url(
         loc: str, changefreq: str = "weekly", priority: str = "0.6", lastmod: str | None = None
     ) -> None:
-        url = SubElement(urlset, "url")
-        SubElement(url, "loc").text = loc
-        if lastmod:
-            SubElement(url, "lastmod").text = lastmod
-        SubElement(url, "changefreq").text = changefreq
-        SubElement(url, "priority").text = priority
+        lastmod_tag = f"<lastmod>{lastmod}</lastmod>" if lastmod else ""
+        parts.append(
+            f"<url><loc>{xml_escape(loc)}</loc>{lastmod_tag}"
+            f"<changefreq>{changefreq}</changefreq><priority>{priority}</priority></url>\n"
+        )
 
     ts = now_utc_iso()
     add_url(f"{base_url}/", lastmod=ts, priority="0.8")
 
     for p in pages_meta:
-        add_url(f"{base_url}/{p['path']}", lastmod=ts)
+        add_url(f"{base_url}/{p.path}", lastmod=ts)
 
-    xml_body = tostring(urlset, encoding="utf-8", method="xml")
-    xml_full = b"<?xml version='1.0' encoding='UTF-8'?>\n" + xml_body
-    (dist / "sitemap.xml").write_bytes(xml_full)
+    parts.append("</urlset>\n")
+    (dist / "sitemap.xml").write_bytes("".join(parts).encode("utf-8"))
 
 
 def write_soft_redirect(dist: pathlib.Path, from_slug: str, to_url: str) -> None:
@@ -126,79 +229,161 @@ def write_soft_redirect(dist: pathlib.Path, from_slug: str, to_url: str) -> None
     Creates OUT/{from_slug}.html that meta-refreshes to to_url.
     Useful as a temporary guard to avoid hard 404s after slug changes.
     """
-    html = f"""<!doctype html>
-<html lang="ko"><head>
-<meta charset="utf-8"/>
-<meta http-equiv="refresh" content="0;url={to_url}"/>
-<link rel="canonical" href="{to_url}"/>
-<title>Redirecting…</title>
-</head><body>
-<p>이 페이지는 <a href="{to_url}">여기로 이동</a>했어.</p>
-</body></html>
-"""
-    (dist / f"{from_slug}.html").write_text(html, encoding="utf-8")
+    (dist / f"{from_slug}.html").write_bytes(REDIRECT_TMPL.format(to_url=to_url).encode("utf-8"))
 
 
-# ── Main ─────────────────────────────────────────────────────────────────────
-def main() -> None:
-    env = Environment(
+# ── Rendering ────────────────────────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def get_env() -> Environment:
+    """Shared Jinja environment; built once per process."""
+    ensure_dir(TPL_CACHE)
+    return Environment(
         loader=FileSystemLoader(str(TPL)),
         autoescape=select_autoescape(["html", "xml"]),
+        bytecode_cache=FileSystemBytecodeCache(directory=str(TPL_CACHE), pattern="%s.cache"),
+        auto_reload=False,
+        cache_size=-1,
     )
 
+
+def init_worker() -> None:
+    """Builds the Jinja environment and compiles page.html once per worker process."""
+    get_env().get_template("page.html")
+
+
+def render_row(
+    row: Item,
+    base_url: str,
+    affiliate_links: Dict[str, AffiliateLink],
+    today_iso: str,
+    year: int,
+) -> Tuple[str, str, PageMeta]:
+    """
+    Renders a single items.csv row (see read_items) into a detail page.
+    Returns (slug, html, meta) where meta is the entry used by the index/sitemap.
+    """
+    slug, keyword, entity, attribute, modifier, merchant = row
+
+    title = f"{keyword} | {entity} {attribute}".strip()
+    desc = f"{entity} {attribute} — {modifier} 기준으로 정리했어."
+    url = f"{base_url}/{slug}.html"
+    schema_json = json.dumps(schema_org_article(title, desc, url, today_iso), ensure_ascii=False)
+    pre, post, tail = affiliate_links.get(merchant, ("", None, ""))
+    affiliate_url = pre + tail if post is None else f"{pre}{slug}{post}{tail}"
+
+    html = get_env().get_template("page.html").render(
+        title=title,
+        description=desc,
+        canonical=url,
+        schema_json=schema_json,
+        year=year,
+        h1=title,
+        subtitle=desc,
+        item={"keyword": keyword, "entity": entity, "attribute": attribute, "modifier": modifier},
+        affiliate_url=affiliate_url,
+        updated=today_iso,
+    )
+    return slug, html, PageMeta(title, desc, f"{slug}.html")
+
+
+# ── Main ─────────────────────────────────────────────────────────────────────
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the AutoSpec static site into dist/.")
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="fail on a missing items.csv / column or an unreadable affiliates.json",
+    )
+    args = parser.parse_args(argv)
+
+    index_tmpl = get_env().get_template("index.html")
+
     base_url = norm_base_url(os.environ.get("BASE_URL", "https://rinosene.github.io"))
     ensure_dir(OUT)
 
-    pages_meta: List[Dict] = []
+    pages_meta: List[PageMeta] = []
+    if args.strict and not DATA.exists():
+        raise SystemExit(f"--strict: {DATA} not found")
+    affiliate_conf = read_json_safe(CONF, strict=args.strict)
+    affiliate_links = build_affiliate_links(affiliate_conf)
+    today = dt.date.today()
+    today_iso = today.isoformat()
+    year = today.year
 
     # ── Generate detail pages from items.csv ─────────────────────────────────
+    # Rows are independent, so rendering fans out across CPUs.
+    # Incremental: a row is only re-rendered when its inputs (row, templates,
+    # builder, config, date) changed, and a page is only rewritten when its bytes did.
     if DATA.exists():
-        with open(DATA, encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                slug = (row.get("deeplink_slug") or "").strip()
-                if not slug:
-                    continue
-
-                title = f"{(row.get('keyword') or '').strip()} | {(row.get('entity') or '').strip()} {(row.get('attribute') or '').strip()}".strip()
-                desc = f"{(row.get('entity') or '').strip()} {(row.get('attribute') or '').strip()} — {(row.get('modifier') or '').strip()} 기준으로 정리했어."
-                url = f"{base_url}/{slug}.html"
-                schema_json = json.dumps(
-                    schema_org_article(title, desc, url), ensure_ascii=False, indent=2
-                )
-                affiliate_url = load_affiliate(row.get("merchant", ""), slug)
-
-                body_paragraph = (
-                    f"{row.get('entity','')}의 {row.get('attribute','')} 선택 기준을 한눈에 정리했어. "
-                    f"추천 스펙은 '{row.get('modifier','')}'이야. "
-                    "상황에 따라 다를 수 있으니 실제 상품 상세를 꼭 확인해줘."
-                )
-
-                tmpl = env.get_template("page.html")
-                html = tmpl.render(
-                    title=title,
-                    description=desc,
-                    canonical=url,
-                    schema_json=schema_json,
-                    year=dt.date.today().year,
-                    h1=title,
-                    subtitle=desc,
-                    item=row,
-                    affiliate_url=affiliate_url,
-                    body_paragraph=body_paragraph,
-                    faq_q1=f"{row.get('entity','')} {row.get('attribute','')}은(는) 무엇을 의미해?",
-                    faq_a1=f"{row.get('attribute','')}은(는) {row.get('entity','')}의 핵심 특성을 정의하는 항목이야.",
-                    faq_q2=f"{row.get('modifier','')}가 모두에게 최선이야?",
-                    faq_a2="아니야. 사용 환경과 목적에 따라 다를 수 있어. 본 페이지는 의사결정을 돕기 위한 가이드야.",
-                    updated=dt.date.today().isoformat(),
-                )
-                (OUT / f"{slug}.html").write_text(html, encoding="utf-8")
-                pages_meta.append({"title": title, "desc": desc, "path": f"{slug}.html"})
+        # One page per slug: a later duplicate row overwrote the earlier one's file anyway,
+        # and the manifest can only track one input key per slug.
+        rows = list({row[0]: row for row in read_items(DATA, strict=args.strict)}.values())
+
+        manifest = read_json_safe(MANIFEST)
+        new_manifest: Dict[str, Dict] = {}
+        build_key = fingerprint(
+            pathlib.Path(__file__).read_text(encoding="utf-8"),
+            *(t.read_text(encoding="utf-8") for t in sorted(TPL.glob("*.html"))),
+            json.dumps(affiliate_conf, sort_keys=True),
+            base_url,
+            today_iso,
+        )
+
+        # Plain string paths in the per-row loops; no Path object per page.
+        out_prefix = str(OUT) + os.sep
+        pages_meta_slots: List[PageMeta | None] = []
+        pending: List[Tuple[int, Item, str]] = []  # (slot index, row, input key)
+        for row in rows:
+            slug = row[0]
+            key = fingerprint(build_key, *row)
+            prev = manifest.get(slug)
+            # Skip only if the page on disk is still exactly what we wrote last time
+            # (not overwritten by a redirect or edited by hand).
+            if (
+                prev
+                and prev.get("src") == key
+                and file_digest(out_prefix + slug + ".html") == prev.get("out")
+            ):
+                new_manifest[slug] = prev
+                # JSON stores the tuple as a list. Manifests from an older builder never
+                # get here: the builder source is part of build_key.
+                pages_meta_slots.append(PageMeta(*prev["meta"]))
+            else:
+                pending.append((len(pages_meta_slots), row, key))
+                pages_meta_slots.append(None)
+
+        if pending:
+            render = partial(
+                render_row,
+                base_url=base_url,
+                affiliate_links=affiliate_links,
+                today_iso=today_iso,
+                year=year,
+            )
+            todo = [row for _, row, _ in pending]
+            with ExitStack() as stack:
+                # Spawning workers costs more than it saves on small batches / one CPU.
+                if len(todo) >= PARALLEL_MIN_ROWS and (os.cpu_count() or 1) > 1:
+                    ex = stack.enter_context(ProcessPoolExecutor(initializer=init_worker))
+                    results = ex.map(render, todo, chunksize=32)
+                else:
+                    results = map(render, todo)
+                for (i, _, key), (slug, html, meta) in zip(pending, results):
+                    data = html.encode("utf-8")
+                    digest = content_digest(data)
+                    path = out_prefix + slug + ".html"
+                    if file_digest(path) != digest:
+                        with open(path, "wb") as fh:
+                            fh.write(data)
+                    new_manifest[slug] = {"src": key, "out": digest, "meta": meta}
+                    pages_meta_slots[i] = meta
+
+        pages_meta = [m for m in pages_meta_slots if m is not None]
+        MANIFEST.write_text(json.dumps(new_manifest, ensure_ascii=False), encoding="utf-8")
     # else: silently proceed with index/aux files only
 
     # ── Index page ───────────────────────────────────────────────────────────
-    tmpl = env.get_template("index.html")
-    index_html = tmpl.render(
+    index_html = index_tmpl.render(
         title="AutoSpec",
         description="사양·호환·규격 모음",
         canonical=f"{base_url}/",
@@ -206,15 +391,15 @@ def main() -> None:
             {"@context": "https://schema.org", "@type": "CollectionPage", "name": "AutoSpec"},
             ensure_ascii=False,
         ),
-        year=dt.date.today().year,
+        year=year,
         pages=pages_meta,
     )
-    (OUT / "index.html").write_text(index_html, encoding="utf-8")
+    (OUT / "index.html").write_bytes(index_html.encode("utf-8"))
 
     # ── Optional soft redirects from data/redirects.csv ──────────────────────
     # CSV header: old_slug,new_slug
     if REDIRECTS.exists():
-        with open(REDIRECTS, encoding="utf-8") as f:
+        with open(REDIRECTS, encoding="utf-8-sig") as f:
             reader = csv.DictReader(f)
             for row in reader:
                 old_slug = (row.get("old_slug") or "").strip()
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # Simple ping to search engines after deploy (optional if hosting gives hook)
 import os, urllib.parse, urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 sitemap = os.environ.get("SITEMAP_URL", "https://example.com/sitemap.xml")
 targets = [
@@ -8,10 +9,21 @@ targets = [
     "https://www.bing.com/ping?sitemap=",
 ]
 
-for t in targets:
+
+def ping(t):
+    """Returns (url, status) on success or (url, exception) on failure."""
     url = t + urllib.parse.quote_plus(sitemap)
     try:
         with urllib.request.urlopen(url, timeout=10) as resp:
-            print("Pinged:", url, resp.status)
+            return url, resp.status
     except Exception as e:
-        print("Fail:", url, e)
+        return url, e
+
+
+# I/O-bound: fire all pings at once so wall time is the slowest target, not the sum.
+with ThreadPoolExecutor(max_workers=len(targets)) as ex:
+    for url, result in ex.map(ping, targets):
+        if isinstance(result, Exception):
+            print("Fail:", url, result)
+        else:
+            print("Pinged:", url, result)